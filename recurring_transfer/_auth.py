@@ -0,0 +1,136 @@
+"""
+Globus authentication shared by the recurring transfer scripts.
+
+The confidential client secret lives in the system keyring. Reading it is an IPC
+round trip on most keyring backends, and trading it for an access token is a
+network round trip to Globus Auth, so both results are cached:
+
+- The keyring lookup is memoized for the life of the process.
+- The transfer access token is written to ~/.cache/globus_transfer/, encrypted
+  with a Fernet key derived from the client secret, and reused by later runs
+  until it expires. Pass refresh_secret=True (--refresh-secret on the command
+  line) to discard both caches.
+"""
+
+import base64
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+import globus_sdk
+import keyring
+from cryptography.fernet import Fernet, InvalidToken
+
+TRANSFER_SCOPE = "urn:globus:auth:scope:transfer.api.globus.org:all"
+TOKEN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "globus_transfer")
+# Cached tokens this close to expiry are not worth reusing
+TOKEN_EXPIRY_MARGIN = 60
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=4)
+def get_secret(service_name, client_id):
+    """
+    Returns the client secret stored in the keyring, or None if there is none.
+    """
+    return keyring.get_password(service_name, client_id)
+
+
+def _token_cache_path(client_id):
+    return os.path.join(TOKEN_CACHE_DIR, f"{client_id}.token")
+
+
+def _load_cached_token(path, fernet):
+    """
+    Returns (access_token, expires_at) from the cache file, or (None, None) if it
+    is missing, unreadable, was encrypted with a different secret, or expires
+    within TOKEN_EXPIRY_MARGIN seconds.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            data = json.loads(fernet.decrypt(fh.read()))
+        access_token, expires_at = data['access_token'], int(data['expires_at'])
+    except (OSError, InvalidToken, ValueError, KeyError, TypeError):
+        return None, None
+    if expires_at <= time.time() + TOKEN_EXPIRY_MARGIN:
+        return None, None
+    return access_token, expires_at
+
+
+def _save_token(path, fernet, token_data):
+    """
+    Encrypts the access token and its expiry to the cache file (mode 0600).
+
+    The file is written under a temporary name and moved into place with
+    os.replace(), so a script starting at the same moment never reads a
+    half-written token.
+    """
+    payload = json.dumps({
+        'access_token': token_data['access_token'],
+        'expires_at': token_data['expires_at_seconds'],
+    }).encode()
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        # mkstemp() creates the file exclusively with mode 0600
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(fernet.encrypt(payload))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # A cache we cannot write only costs a token request on the next run
+        logger.warning(f"Could not write token cache {path}: {e}")
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def get_authorizer(service_name, client_id, refresh_secret=False):
+    """
+    Retrieves the secret from keyring using Client ID as the username.
+
+    Args:
+        service_name (str): The name of the keyring service (e.g., 'Globus_MPF').
+        client_id (str): The Globus Client UUID.
+        refresh_secret (bool): Ignore the cached secret and access token.
+
+    Returns:
+        globus_sdk.ClientCredentialsAuthorizer: The Globus authorizer.
+    """
+    cache_path = _token_cache_path(client_id)
+    if refresh_secret:
+        get_secret.cache_clear()
+        try:
+            os.remove(cache_path)
+        except FileNotFoundError:
+            pass
+
+    secret = get_secret(service_name, client_id)
+    if not secret:
+        raise ValueError(
+            f"Could not retrieve client secret from keyring for service '{service_name}' "
+            f"and user '{client_id}'. Ensure it is set via keyring.set_password()."
+        )
+
+    fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest()))
+    access_token, expires_at = _load_cached_token(cache_path, fernet)
+
+    def on_refresh(response):
+        token_data = next(iter(response.by_resource_server.values()))
+        _save_token(cache_path, fernet, token_data)
+
+    client = globus_sdk.ConfidentialAppAuthClient(client_id, secret)
+    return globus_sdk.ClientCredentialsAuthorizer(
+        client,
+        scopes=TRANSFER_SCOPE,
+        access_token=access_token,
+        expires_at=expires_at,
+        on_refresh=on_refresh,
+    )
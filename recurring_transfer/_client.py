@@ -0,0 +1,42 @@
+"""
+Reusable Globus TransferClient for the recurring transfer scripts.
+
+A TransferClient keeps a requests.Session, so repeated calls made through the
+same client reuse the pooled keep-alive connection to the Transfer API instead of
+redoing the TCP and TLS handshakes. Clients are cached per (client_id,
+service_name) for the life of the process. When several scripts are run back to
+back from one Python process (for example by importing them and calling
+main()), they share a single connection.
+"""
+
+import globus_sdk
+
+from _auth import get_authorizer
+
+# (client_id, service_name) -> globus_sdk.TransferClient
+_session_cache = {}
+
+
+def get_transfer_client(service_name, client_id, refresh_secret=False):
+    """
+    Returns a TransferClient for the client, reusing one built earlier if possible.
+
+    Args:
+        service_name (str): The name of the keyring service (e.g., 'Globus_MPF').
+        client_id (str): The Globus Client UUID.
+        refresh_secret (bool): Drop the cached client, secret and access token
+            and authenticate again.
+
+    Returns:
+        globus_sdk.TransferClient: The transfer client.
+    """
+    key = (client_id, service_name)
+    if refresh_secret:
+        _session_cache.pop(key, None)
+
+    tc = _session_cache.get(key)
+    if tc is None:
+        authorizer = get_authorizer(service_name, client_id, refresh_secret)
+        tc = globus_sdk.TransferClient(authorizer=authorizer)
+        _session_cache[key] = tc
+    return tc
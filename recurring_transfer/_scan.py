@@ -0,0 +1,424 @@
+"""
+Source tree scanning shared by the recurring transfer scripts.
+
+Every script does the same thing: walk SOURCE_ROOT, keep the files whose mtime
+falls inside a time window, and map each one to a Globus source/destination
+path pair. The scripts only differ in the window they pass in and in whether
+destination filenames get the file's mtime appended.
+"""
+
+import fnmatch
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+
+from _statx import fast_stat
+
+# Files the worker pool may stat ahead of the consumer
+SCAN_BATCH_SIZE = 5000
+# Directories whose descriptors may be held open while their files are stat'd
+MAX_OPEN_DIRS = 256
+# Largest number of items put in a single Globus transfer task
+MAX_ITEMS_PER_TASK = 50000
+
+# os.fwalk() is only defined where scandir() accepts a directory descriptor
+_SCANDIR_FD = hasattr(os, 'fwalk') and os.scandir in os.supports_fd
+_DIR_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_CLOEXEC', 0)
+# Characters that make an exclude_dirs entry an fnmatch pattern rather than a name
+_GLOB_CHARS = re.compile(r'[*?[]')
+
+
+def iter_dirs(root, prune_before=None, exclude=None):
+    """
+    Yields (dir_path, dir_fd, file_entries) for root and every directory beneath it.
+
+    Uses an explicit stack of os.scandir() calls so the stat information gathered
+    while reading each directory is reused instead of stat-ing every path again.
+    Unreadable directories are skipped, as os.walk does by default, and so are
+    sockets, FIFOs and device nodes, which Globus cannot transfer.
+
+    Entries are classified from the d_type readdir() returns, so on ext4, XFS and
+    most local filesystems no stat() is made until the window check. Filesystems
+    that report DT_UNKNOWN for everything (some FUSE and network mounts) still
+    work, but each entry then costs an extra stat() here.
+
+    Where the platform allows it (the same condition os.fwalk() needs), each
+    directory is opened once and scanned through its file descriptor, so the
+    entries are stat'd relative to dir_fd and the kernel resolves only their own
+    name rather than the full path. The caller owns dir_fd and must close it.
+    Elsewhere dir_fd is None and the entries carry full paths.
+
+    If exclude is given, it is called with each subdirectory's name and the
+    subdirectory is skipped, without being stat'd or opened, when it returns True.
+
+    If prune_before is a time in nanoseconds since the epoch, subdirectories whose
+    mtime and ctime are both older than it are not descended into. A directory's
+    mtime only changes when entries are added, removed or renamed directly inside
+    it, so this misses files edited in place and files created deeper in an old
+    subtree; it is only safe for write-once layouts where new data lands in new
+    directories.
+    """
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            dir_fd, files, subdirs = scan_dir(path, prune_before, exclude)
+        except OSError:
+            continue
+        stack.extend(subdirs)
+        yield path, dir_fd, files
+
+
+def scan_dir(path, prune_before=None, exclude=None):
+    """
+    Reads a single directory the way iter_dirs() does.
+
+    Returns:
+        tuple: (dir_fd, file_entries, subdir_paths). dir_fd is None where
+        scandir() cannot take a descriptor; otherwise the caller must close it.
+
+    Raises:
+        OSError: If the directory cannot be read. No descriptor is left open.
+    """
+    dir_fd = None
+    try:
+        if _SCANDIR_FD:
+            dir_fd = os.open(path, _DIR_FLAGS)
+        files = []
+        subdirs = []
+        # scandir() dups dir_fd, so closing the iterator leaves ours open
+        with os.scandir(path if dir_fd is None else dir_fd) as it:
+            for entry in it:
+                # Regular files are by far the common case; is_file() answers
+                # from readdir's d_type without touching the inode
+                if entry.is_file(follow_symlinks=False):
+                    files.append(entry)
+                elif entry.is_dir(follow_symlinks=False):
+                    if exclude is not None and exclude(entry.name):
+                        continue
+                    if prune_before is not None and is_stale_dir(entry, prune_before):
+                        continue
+                    subdirs.append(os.path.join(path, entry.name))
+                elif entry.is_symlink() and entry.is_file():
+                    # Symlinks to files are transferred; symlinks to directories
+                    # are neither followed nor transferred
+                    files.append(entry)
+    except OSError:
+        if dir_fd is not None:
+            os.close(dir_fd)
+        raise
+    return dir_fd, files, subdirs
+
+
+def is_stale_dir(entry, prune_before):
+    """
+    Returns True if a directory's own mtime and ctime are both older than
+    prune_before (nanoseconds since the epoch), or it cannot be stat'd.
+    """
+    try:
+        st = entry.stat(follow_symlinks=False)
+    except OSError:
+        return True
+    return max(st.st_mtime_ns, st.st_ctime_ns) < prune_before
+
+
+def compile_dir_excludes(patterns):
+    """
+    Builds the exclude test for iter_dirs() from directory names and globs.
+
+    Args:
+        patterns (iterable): Names such as '.snapshot' and fnmatch patterns such
+            as '.Trash-*', matched against a directory's own name.
+
+    Returns:
+        callable: Takes a directory name and returns True if it is excluded, or
+        None if there are no patterns.
+    """
+    patterns = [p for p in patterns if p]
+    if not patterns:
+        return None
+    # Plain names are a set lookup; all globs share one precompiled regex
+    names = frozenset(p for p in patterns if not _GLOB_CHARS.search(p))
+    globs = [p for p in patterns if p not in names]
+    if not globs:
+        return names.__contains__
+    match = re.compile('|'.join(fnmatch.translate(p) for p in globs)).match
+    return lambda name: name in names or match(name) is not None
+
+
+def _batched(iterable, n):
+    # itertools.batched() only exists on Python 3.12+
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+
+def datetime_to_ns(dt):
+    """
+    Converts a naive local datetime to integer nanoseconds since the epoch.
+
+    Only whole seconds go through float timestamp(), so the result is exact.
+    """
+    return int(dt.replace(microsecond=0).timestamp()) * 1_000_000_000 + dt.microsecond * 1000
+
+
+def window_end_ns(dt):
+    """
+    Converts the inclusive end of a window (e.g. time.max, 23:59:59.999999) to the
+    last nanosecond it covers.
+
+    datetime stops at microseconds, so datetime_to_ns() alone would leave mtimes in
+    the final 999 ns outside both this window and the next, which starts at .0.
+    """
+    return datetime_to_ns(dt) + 999
+
+
+def root_prefix(root):
+    # posixpath.join(root, x) == root_prefix(root) + x for any relative x
+    if not root or root.endswith('/'):
+        return root
+    return root + '/'
+
+
+def iter_matches(
+    source_root,
+    globus_source_root,
+    globus_dest_root,
+    start_ns,
+    end_ns,
+    *,
+    timestamped=True,
+    workers=32,
+    prune_by_dir_mtime=False,
+    exclude_dirs=(),
+    logger=None,
+    cache=None,
+    _localtime=time.localtime,
+):
+    """
+    Yields the files under source_root modified between start_ns and end_ns.
+
+    Args:
+        source_root (str): Absolute local path to scan.
+        globus_source_root (str): The same directory as seen by the source endpoint.
+        globus_dest_root (str): Base path on the destination endpoint.
+        start_ns (int): Window start in nanoseconds since the epoch (inclusive).
+        end_ns (int): Window end in nanoseconds since the epoch (inclusive).
+        timestamped (bool): Append the file's mtime to destination filenames
+            (data.csv -> data_20250101_120000.csv) so transfers never overwrite.
+        workers (int): Threads used to stat files concurrently.
+        prune_by_dir_mtime (bool): Skip subdirectories older than the window.
+        exclude_dirs (iterable): Directory names or fnmatch patterns (e.g. '.git',
+            '.Trash-*') whose subtrees are not scanned at all.
+        logger (logging.Logger): If given, files that cannot be stat'd are logged.
+        cache (ScanCache): If given, files already submitted with the same mtime
+            are skipped.
+
+    Yields:
+        tuple: (globus_source_path, globus_dest_path, FileStat) in walk order. The
+        FileStat is the one stat result fetched for the window check, carried
+        along so later stages never need to stat the file again.
+
+    Up to SCAN_BATCH_SIZE files (from at most MAX_OPEN_DIRS directories) are
+    stat'd ahead of the caller, so memory and open descriptors stay bounded no
+    matter how large the tree is.
+
+    The underscore-prefixed keyword arguments are not meant to be passed. Binding
+    them as defaults turns the per-file global lookups into fast local loads.
+    """
+    def stat_and_filter(entry, dir_path, dir_fd):
+        # Runs on the worker pool: stat one file and keep it only if it is in the window
+        try:
+            st = fast_stat(entry, dir_fd)
+        except OSError as e:
+            if logger is not None:
+                logger.warning(f"Could not process {os.path.join(dir_path, entry.name)}: {e}")
+            return None
+        # Plain int comparison: no float or datetime conversion per file
+        if start_ns <= st.st_mtime_ns <= end_ns:
+            return entry, st
+        return None
+
+    # (dir_path, dir_fd, file count, pool.map results) for directories still being stat'd
+    pending = deque()
+
+    def finish_oldest():
+        # Waits for the oldest directory's stats, then releases its descriptor
+        dir_path, dir_fd, count, results = pending.popleft()
+        try:
+            return dir_path, count, [match for match in results if match is not None]
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+    def iter_stat_results(pool):
+        # Each stat is an independent, latency-bound syscall that releases the GIL,
+        # so whole directories are handed to the pool while the walk carries on.
+        in_flight = 0
+        for dir_path, dir_fd, files in iter_dirs(source_root, prune_before, exclude):
+            results = pool.map(stat_and_filter, files, repeat(dir_path), repeat(dir_fd))
+            pending.append((dir_path, dir_fd, len(files), results))
+            in_flight += len(files)
+            while pending and (in_flight >= SCAN_BATCH_SIZE or len(pending) >= MAX_OPEN_DIRS):
+                done_path, count, matches = finish_oldest()
+                in_flight -= count
+                yield done_path, matches
+        while pending:
+            done_path, _, matches = finish_oldest()
+            yield done_path, matches
+
+    # Globus paths are always POSIX and the roots never change, so paths are built
+    # by concatenating onto these prefixes instead of calling posixpath.join per file
+    src_prefix = root_prefix(globus_source_root)
+    dst_prefix = root_prefix(globus_dest_root)
+
+    # Every directory the walk yields is os.path.join(source_root, ...), so its
+    # relative path is a fixed-length slice and needs no os.path.relpath()
+    local_prefix = os.path.join(source_root, '')
+    root_prefix_len = len(local_prefix)
+
+    prune_before = start_ns if prune_by_dir_mtime else None
+    exclude = compile_dir_excludes(exclude_dirs)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for dir_path, matches in iter_stat_results(pool):
+                if not matches:
+                    continue
+                assert dir_path == source_root or dir_path.startswith(local_prefix)
+                # Everything that depends only on the directory is worked out once
+                # here, so each file just appends its name
+                rel_dir = dir_path[root_prefix_len:]
+                if rel_dir:
+                    g_source_dir = f"{src_prefix}{rel_dir}/"
+                    g_dest_dir = f"{dst_prefix}{rel_dir}/"
+                else:
+                    g_source_dir, g_dest_dir = src_prefix, dst_prefix
+
+                for entry, st in matches:
+                    name = entry.name
+                    g_source = g_source_dir + name
+                    if cache is not None and cache.is_transferred(g_source, st.st_mtime_ns):
+                        continue
+
+                    if timestamped:
+                        # Same split as os.path.splitext(): leading dots never start an extension
+                        dot = name.rfind('.')
+                        if dot > 0 and (name[0] != '.' or name[:dot].strip('.')):
+                            name_part, ext_part = name[:dot], name[dot:]
+                        else:
+                            name_part, ext_part = name, ''
+                        # Same digits as strftime("%Y%m%d_%H%M%S"), without building a datetime
+                        tm = _localtime(st.st_mtime_ns // 1_000_000_000)
+                        g_dest = (f"{g_dest_dir}{name_part}_"
+                                  f"{tm.tm_year:04d}{tm.tm_mon:02d}{tm.tm_mday:02d}_"
+                                  f"{tm.tm_hour:02d}{tm.tm_min:02d}{tm.tm_sec:02d}{ext_part}")
+                    else:
+                        g_dest = g_dest_dir + name
+
+                    yield g_source, g_dest, st
+    finally:
+        # Only non-empty if the caller stopped early. The pool has shut down by
+        # now, so no worker is still using these descriptors.
+        for _, dir_fd, _, _ in pending:
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+
+def add_transfer_items(transfer_data, items):
+    """
+    Appends (source, destination, FileStat) items to a TransferData in a single pass.
+
+    These are the same transfer_item documents TransferData.add_item() builds for
+    a plain file, without the per-call method dispatch and debug formatting.
+    """
+    transfer_data["DATA"].extend(
+        {"DATA_TYPE": "transfer_item", "source_path": s, "destination_path": d}
+        for s, d, _ in items
+    )
+
+
+def submit_in_chunks(tc, new_transfer_data, items, chunk_size=MAX_ITEMS_PER_TASK,
+                     cache=None, logger=None):
+    """
+    Submits items as one or more transfer tasks of at most chunk_size files.
+
+    The scan runs in the calling thread while a background thread submits each
+    task as soon as it fills up, so the walk keeps reading the source filesystem
+    during the round trip to Globus. The hand-off queue holds a single chunk, so
+    at most one chunk is waiting while another is being submitted, and every
+    chunk submitted before a crash has already reached Globus.
+
+    Args:
+        tc (globus_sdk.TransferClient): Client used to submit the tasks.
+        new_transfer_data (callable): Given the 1-based part number, returns an
+            empty globus_sdk.TransferData.
+        items (iterable): Tuples yielded by iter_matches().
+        chunk_size (int): Maximum number of items per task.
+        cache (ScanCache): If given, each submitted chunk is recorded in it.
+        logger (logging.Logger): If given, each task ID is logged as soon as
+            its task is submitted.
+
+    Returns:
+        tuple: (number of items submitted, list of task IDs)
+
+    Raises:
+        Exception: Whatever submit_transfer() or the scan raised. No further
+            chunks are submitted after a failed submit; chunks queued before a
+            scan failure still are. The exception's task_ids attribute lists the
+            tasks that did reach Globus.
+    """
+    pending = queue.Queue(maxsize=1)
+    task_ids = []
+    errors = []
+
+    def submitter():
+        while True:
+            job = pending.get()
+            if job is None:
+                return
+            if errors:
+                # Keep draining so the scan thread never blocks on a full queue
+                continue
+            transfer_data, chunk = job
+            try:
+                task = tc.submit_transfer(transfer_data)
+                task_ids.append(task['task_id'])
+                if logger is not None:
+                    logger.info(f"Submitted task {task['task_id']} ({len(chunk)} files)")
+                if cache is not None:
+                    cache.record(chunk, task['task_id'])
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=submitter, name="globus-submit", daemon=True)
+    thread.start()
+    files_added = 0
+    scan_error = None
+    try:
+        for part, chunk in enumerate(_batched(items, chunk_size), 1):
+            if errors:
+                break
+            transfer_data = new_transfer_data(part)
+            add_transfer_items(transfer_data, chunk)
+            pending.put((transfer_data, chunk))
+            files_added += len(chunk)
+    except Exception as e:
+        # Raised below, once the chunk already queued has been submitted
+        scan_error = e
+    finally:
+        pending.put(None)
+        thread.join()
+    if errors or scan_error is not None:
+        error = errors[0] if errors else scan_error
+        # Lets the caller report the tasks that were submitted before the failure
+        error.task_ids = task_ids
+        raise error
+    return files_added, task_ids
@@ -0,0 +1,63 @@
+"""
+Persistent record of files already submitted to Globus.
+
+The nightly and monthly scripts re-walk overlapping trees, so most files that
+match a window have already been sent by an earlier run. ScanCache keeps a small
+SQLite table of (Globus source path, mtime in ns, size, task ID) for every submitted
+file, letting a later run skip anything whose mtime has not changed since.
+
+A task ID is recorded when the task is submitted, not when it succeeds. Delete
+the cache file to force a full re-send after a failed task.
+"""
+
+import sqlite3
+
+
+class ScanCache:
+    """
+    SQLite-backed map of submitted files.
+
+    Args:
+        db_path (str): Location of the SQLite database, created if missing.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # Written from the submit thread in submit_in_chunks(), one chunk at a time
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, task_id TEXT)"
+        )
+        # Loaded once up front so lookups during the scan never touch the database
+        self._transferred = dict(self.conn.execute(
+            "SELECT path, mtime_ns FROM entries WHERE task_id IS NOT NULL"
+        ))
+        self.skipped = 0
+
+    def is_transferred(self, path, mtime_ns):
+        """
+        Returns True if path was already submitted with this exact mtime.
+        """
+        if self._transferred.get(path) == mtime_ns:
+            self.skipped += 1
+            return True
+        return False
+
+    def record(self, items, task_id):
+        """
+        Stores the items of a submitted task in a single transaction.
+
+        Args:
+            items (list): (globus_source_path, globus_dest_path, FileStat) tuples.
+            task_id (str): The Globus task they were submitted in.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (path, mtime_ns, size, task_id) "
+                "VALUES (?, ?, ?, ?)",
+                [(s, st.st_mtime_ns, st.st_size, task_id) for s, _, st in items]
+            )
+
+    def close(self):
+        self.conn.close()
@@ -22,11 +22,12 @@ Usage:
 
 import globus_sdk
 import os
-import keyring
 import logging
-import posixpath
 import configparser
 from datetime import datetime, timedelta, time
+from _client import get_transfer_client
+from _scan import datetime_to_ns, iter_matches, submit_in_chunks, window_end_ns
+from _scan_cache import ScanCache
 
 def setup_logging():
     """
@@ -39,29 +40,6 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-def get_authorizer(service_name, client_id):
-    """
-    Retrieves the secret from keyring using Client ID as the username.
-    
-    Args:
-        service_name (str): The name of the keyring service (e.g., 'Globus_MPF').
-        client_id (str): The Globus Client UUID.
-        
-    Returns:
-        globus_sdk.ClientCredentialsAuthorizer: The Globus authorizer.
-    """
-    secret = keyring.get_password(service_name, client_id)
-    
-    if not secret:
-        raise ValueError(
-            f"Could not retrieve client secret from keyring for service '{service_name}' "
-            f"and user '{client_id}'. Ensure it is set via keyring.set_password()."
-        )
-
-    client = globus_sdk.ConfidentialAppAuthClient(client_id, secret)
-    scopes = "urn:globus:auth:scope:transfer.api.globus.org:all"
-    return globus_sdk.ClientCredentialsAuthorizer(client, scopes=scopes)
-
 def main():
     logger = setup_logging()
     config = configparser.ConfigParser()
@@ -81,6 +59,10 @@ def main():
         SOURCE_EP = config['globus']['SOURCE_ENDPOINT_ID']
         DEST_EP = config['globus']['DEST_ENDPOINT_ID']
         DEST_ROOT = config['globus']['DEST_BASE_PATH']
+        SCAN_WORKERS = config.getint('scan', 'workers', fallback=32)
+        PRUNE_BY_DIR_MTIME = config.getboolean('scan', 'prune_by_dir_mtime', fallback=False)
+        SCAN_CACHE = config.getboolean('scan', 'scan_cache', fallback=False)
+        EXCLUDE_DIRS = [d.strip() for d in config.get('scan', 'exclude_dirs', fallback='').split(',')]
     except KeyError as e:
         logger.error(f"Missing config key: {e}")
         return
@@ -89,46 +71,53 @@ def main():
     yesterday = datetime.now().date() - timedelta(days=1)
     start_window = datetime.combine(yesterday, time.min)
     end_window = datetime.combine(yesterday, time.max)
+    # Compare integer nanosecond mtimes in the scan loop instead of building a datetime per file
+    start_ns = datetime_to_ns(start_window)
+    end_ns = window_end_ns(end_window)
     
     logger.info(f"Scanning {SOURCE_ROOT} for files modified yesterday...")
 
     try:
-        authorizer = get_authorizer(SERVICE_NAME, CLIENT_ID)
-        tc = globus_sdk.TransferClient(authorizer=authorizer)
+        tc = get_transfer_client(SERVICE_NAME, CLIENT_ID)
     except Exception as e:
         logger.error(f"Auth failed: {e}")
         return
 
-    transfer_data = globus_sdk.TransferData(
-        source_endpoint=SOURCE_EP,
-        destination_endpoint=DEST_EP,
-        label=f"Sync_{yesterday}",
-        sync_level="mtime"
+    def new_transfer_data(part):
+        return globus_sdk.TransferData(
+            source_endpoint=SOURCE_EP,
+            destination_endpoint=DEST_EP,
+            label=f"Sync_{yesterday}_part{part}",
+            sync_level="mtime"
+        )
+
+    # Files already submitted by an earlier run are skipped when [scan] scan_cache is on
+    cache = ScanCache('nightly_sync_cache.sqlite') if SCAN_CACHE else None
+
+    # Walk through every file, submitting a task each time MAX_ITEMS_PER_TASK files are queued
+    matches = iter_matches(
+        SOURCE_ROOT, GLOBUS_SOURCE_ROOT, DEST_ROOT, start_ns, end_ns,
+        timestamped=False, workers=SCAN_WORKERS, prune_by_dir_mtime=PRUNE_BY_DIR_MTIME,
+        exclude_dirs=EXCLUDE_DIRS, cache=cache
     )
+    try:
+        files_added, task_ids = submit_in_chunks(
+            tc, new_transfer_data, matches, cache=cache, logger=logger
+        )
+    except Exception as e:
+        logger.error(f"Transfer failed: {e}")
+        for task_id in getattr(e, 'task_ids', ()):
+            logger.warning(f"Task {task_id} was submitted before the failure")
+        return
+    finally:
+        if cache is not None:
+            cache.close()
 
-    files_added = 0
-    # Walk through every file
-    for root, dirs, files in os.walk(SOURCE_ROOT):
-        for f in files:
-            file_path = os.path.join(root, f)
-            try:
-                # Get local mtime
-                mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
-                
-                if start_window <= mtime <= end_window:
-                    # Create the relative path for Globus
-                    rel_path = os.path.relpath(file_path, SOURCE_ROOT)
-                    g_source = posixpath.join(GLOBUS_SOURCE_ROOT, rel_path)
-                    g_dest = posixpath.join(DEST_ROOT, rel_path)
-                    
-                    transfer_data.add_item(g_source, g_dest)
-                    files_added += 1
-            except OSError:
-                continue
+    if cache is not None and cache.skipped:
+        logger.info(f"Skipped {cache.skipped} files already submitted by earlier runs ({cache.db_path}).")
 
     if files_added > 0:
-        task = tc.submit_transfer(transfer_data)
-        logger.info(f"Success! Task ID: {task['task_id']}")
+        logger.info(f"Success! Submitted {files_added} files in {len(task_ids)} task(s).")
     else:
         logger.info("Sync skipped: No files matched the date window.")
 
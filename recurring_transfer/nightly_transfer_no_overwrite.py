@@ -25,12 +25,13 @@ Usage DRY RUN:
 
 import globus_sdk
 import os
-import keyring
 import logging
-import posixpath
 import configparser
 import argparse
 from datetime import datetime, timedelta, time
+from _client import get_transfer_client
+from _scan import datetime_to_ns, iter_matches, submit_in_chunks, window_end_ns
+from _scan_cache import ScanCache
 
 def setup_logging():
     logging.basicConfig(
@@ -40,45 +41,24 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-def get_authorizer(service_name, client_id):
-    secret = keyring.get_password(service_name, client_id)
-    if not secret:
-        raise ValueError(f"Secret not found in keyring for {client_id}")
-
-    client = globus_sdk.ConfidentialAppAuthClient(client_id, secret)
-    scopes = "urn:globus:auth:scope:transfer.api.globus.org:all"
-    return globus_sdk.ClientCredentialsAuthorizer(client, scopes=scopes)
-
-def add_files_with_timestamps(transfer_data, source_local_root, globus_source_root, 
-                             globus_dest_root, logger, start_window, end_window, dry_run):
-    files_added = 0
-    for root, dirs, files in os.walk(source_local_root):
-        for f in files:
-            file_path = os.path.join(root, f)
-            try:
-                mtime_ts = os.path.getmtime(file_path)
-                mtime = datetime.fromtimestamp(mtime_ts)
-                
-                if start_window <= mtime <= end_window:
-                    rel_path = os.path.relpath(file_path, source_local_root)
-                    rel_dir = os.path.dirname(rel_path)
-                    
-                    name_part, ext_part = os.path.splitext(f)
-                    timestamp_str = mtime.strftime("%Y%m%d_%H%M%S")
-                    new_filename = f"{name_part}_{timestamp_str}{ext_part}"
-                    
-                    g_source = posixpath.join(globus_source_root, rel_path)
-                    g_dest = posixpath.join(globus_dest_root, rel_dir, new_filename)
-                    
-                    if dry_run:
-                        logger.info(f"[DRY RUN] Queue: {rel_path} -> {new_filename}")
-                    else:
-                        transfer_data.add_item(g_source, g_dest)
-                    
-                    files_added += 1
-            except OSError:
-                continue
-    return files_added
+def add_files_with_timestamps(tc, new_transfer_data, source_local_root, globus_source_root, 
+                             globus_dest_root, logger, start_ns, end_ns, dry_run,
+                             workers=32, prune_by_dir_mtime=False, cache=None,
+                             exclude_dirs=()):
+    matches = iter_matches(
+        source_local_root, globus_source_root, globus_dest_root, start_ns, end_ns,
+        workers=workers, prune_by_dir_mtime=prune_by_dir_mtime,
+        exclude_dirs=exclude_dirs, cache=cache
+    )
+
+    if dry_run:
+        files_added = 0
+        for g_source, g_dest, _ in matches:
+            logger.info(f"[DRY RUN] Queue: {g_source} -> {g_dest}")
+            files_added += 1
+        return files_added, []
+
+    return submit_in_chunks(tc, new_transfer_data, matches, cache=cache, logger=logger)
 
 def main():
     # Setup argparse
@@ -88,6 +68,11 @@ def main():
         action="store_true", 
         help="Scan and log files without submitting the Globus transfer."
     )
+    parser.add_argument(
+        "--refresh-secret",
+        action="store_true",
+        help="Re-read the client secret from keyring and discard the cached access token"
+    )
     args = parser.parse_args()
 
     logger = setup_logging()
@@ -107,6 +92,10 @@ def main():
         SOURCE_EP = config['globus']['SOURCE_ENDPOINT_ID']
         DEST_EP = config['globus']['DEST_ENDPOINT_ID']
         DEST_ROOT = config['globus']['DEST_BASE_PATH']
+        SCAN_WORKERS = config.getint('scan', 'workers', fallback=32)
+        PRUNE_BY_DIR_MTIME = config.getboolean('scan', 'prune_by_dir_mtime', fallback=False)
+        SCAN_CACHE = config.getboolean('scan', 'scan_cache', fallback=False)
+        EXCLUDE_DIRS = [d.strip() for d in config.get('scan', 'exclude_dirs', fallback='').split(',')]
     except KeyError as e:
         logger.error(f"Missing config key: {e}")
         return
@@ -114,37 +103,58 @@ def main():
     yesterday = datetime.now().date() - timedelta(days=1)
     start_window = datetime.combine(yesterday, time.min)
     end_window = datetime.combine(yesterday, time.max)
+    # Compare integer nanosecond mtimes in the scan loop instead of building a datetime per file
+    start_ns = datetime_to_ns(start_window)
+    end_ns = window_end_ns(end_window)
     
     logger.info(f"Targeting Yesterday: {yesterday}")
     if args.dry_run:
         logger.info("Dry Run!")
 
     try:
-        authorizer = get_authorizer(SERVICE_NAME, CLIENT_ID)
-        tc = globus_sdk.TransferClient(authorizer=authorizer)
+        tc = get_transfer_client(SERVICE_NAME, CLIENT_ID, args.refresh_secret)
     except Exception as e:
         logger.error(f"Auth failed: {e}")
         return
 
-    transfer_data = globus_sdk.TransferData(
-        source_endpoint=SOURCE_EP,
-        destination_endpoint=DEST_EP,
-        label=f"Daily_Sync_{yesterday}",
-        sync_level=None,
-        verify_checksum=True
-    )
+    def new_transfer_data(part):
+        return globus_sdk.TransferData(
+            source_endpoint=SOURCE_EP,
+            destination_endpoint=DEST_EP,
+            label=f"Daily_Sync_{yesterday}_part{part}",
+            sync_level=None,
+            verify_checksum=True
+        )
 
-    total_added = add_files_with_timestamps(
-        transfer_data, SOURCE_ROOT, GLOBUS_SOURCE_ROOT, 
-        DEST_ROOT, logger, start_window, end_window, args.dry_run
-    )
+    # Files already submitted by an earlier run are skipped when [scan] scan_cache is on
+    cache = ScanCache('nightly_no_overwrite_cache.sqlite') if SCAN_CACHE else None
+
+    try:
+        total_added, task_ids = add_files_with_timestamps(
+            tc, new_transfer_data, SOURCE_ROOT, GLOBUS_SOURCE_ROOT, 
+            DEST_ROOT, logger, start_ns, end_ns, args.dry_run,
+            SCAN_WORKERS,
+            PRUNE_BY_DIR_MTIME,
+            cache,
+            EXCLUDE_DIRS
+        )
+    except Exception as e:
+        logger.error(f"Transfer failed: {e}")
+        for task_id in getattr(e, 'task_ids', ()):
+            logger.warning(f"Task {task_id} was submitted before the failure")
+        return
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if cache is not None and cache.skipped:
+        logger.info(f"Skipped {cache.skipped} files already submitted by earlier runs ({cache.db_path}).")
 
     if total_added > 0:
         if args.dry_run:
             logger.info(f"Dry run complete. {total_added} files identified.")
         else:
-            task = tc.submit_transfer(transfer_data)
-            logger.info(f"Task submitted! ID: {task['task_id']}")
+            logger.info(f"Task submitted! {total_added} files in {len(task_ids)} task(s).")
     else:
         logger.info(f"No files modified on {yesterday} were found.")
 
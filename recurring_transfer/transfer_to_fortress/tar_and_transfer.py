@@ -9,24 +9,51 @@ Workflow:
 5. Submits the batch to Globus.
 
 Usage:
-    python nightly_transfer.py
+    python tar_and_transfer.py [--refresh-secret]
 
 This will submit a transfer request using Globus 
 """
 
 import globus_sdk
+import argparse
+import functools
 import os
-import keyring
 import logging
-import posixpath
 import configparser
+import shutil
+import sqlite3
+import subprocess
+import sys
 import tarfile
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, time
 
+# Authentication (keyring secret and cached access token) and Globus path helpers
+# are shared with the scripts one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from _client import get_transfer_client
+from _scan import (compile_dir_excludes, datetime_to_ns, iter_dirs, root_prefix, scan_dir,
+                   window_end_ns)
+
 # Setting a file size threshold
 # If average file size in a folder is < 50MB, tar it -- this follows HPSS best practices 
 SMALL_FILE_THRESHOLD = 50 * 1024 * 1024 
+# Write buffer for tarballs in STAGING_ROOT (tarfile fallback only)
+TAR_WRITE_BUFFER = 4 * 1024 * 1024
+# Largest name, size, mtime and uid/gid a USTAR header holds
+USTAR_NAME_MAX = 100
+USTAR_SIZE_MAX = 8 ** 11 - 1
+USTAR_TIME_MAX = 8 ** 11 - 1
+USTAR_ID_MAX = 8 ** 7 - 1
+# Block size tarfile uses in stream mode (the default is 10 KiB)
+TAR_STREAM_BUFSIZE = 1024 * 1024
+# Top-level subdirectories of SOURCE_ROOT scanned at once
+SCAN_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+# Tarballs built at once; more than a handful tends to saturate the staging filesystem
+TAR_WORKERS = min(8, os.cpu_count() or 1)
+# Persistent directory/file index used when [scan] mtime_index is on (next to the log)
+MTIME_INDEX_PATH = 'nightly_sync_index.sqlite'
 
 def setup_logging():
     logging.basicConfig(
@@ -39,21 +66,328 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-def get_authorizer(service_name, client_id):
-    secret = keyring.get_password(service_name, client_id)
-    if not secret:
-        raise ValueError(f"No secret found in keyring for {service_name}")
-    client = globus_sdk.ConfidentialAppAuthClient(client_id, secret)
-    return globus_sdk.ClientCredentialsAuthorizer(client, scopes="urn:globus:auth:scope:transfer.api.globus.org:all")
+def make_dir_exclude(exclude_dirs=(), skip_hidden=False):
+    """
+    Builds the name test for directories the scan never descends into.
+
+    Args:
+        exclude_dirs: Directory names or fnmatch patterns (e.g. '.git',
+            '.Trash-*'), matched as in the recurring scripts
+        skip_hidden: Also skip every directory whose name starts with '.'
+
+    Returns:
+        A function taking a directory name and returning True to skip it, or
+        None if no directory is excluded. The names it rejected are collected
+        in its skipped list.
+    """
+    exclude = compile_dir_excludes(exclude_dirs)
+    if exclude is None and not skip_hidden:
+        return None
+    # list.append is atomic, so scan threads can share it
+    skipped = []
+
+    def is_excluded(name):
+        if (skip_hidden and name.startswith('.')) or (exclude is not None and exclude(name)):
+            skipped.append(name)
+            return True
+        return False
+
+    is_excluded.skipped = skipped
+    return is_excluded
+
+def _modified_in_dir(dir_path, dir_fd, files, start_ns, end_ns):
+    """
+    Yields (dir_path, file_path, stat_result) for the files of one directory from
+    _scan.iter_dirs() whose mtime is inside the window, then closes dir_fd.
+    """
+    try:
+        for entry in files:
+            try:
+                # Follows symlinks, so the tarball stores (and is sized by) the target
+                st = entry.stat()
+            except OSError:
+                continue
+            if start_ns <= st.st_mtime_ns <= end_ns:
+                yield dir_path, os.path.join(dir_path, entry.name), st
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+def iter_modified(root, start_ns, end_ns, exclude=None, prune_before=None):
+    """
+    Walks root with _scan.iter_dirs() and yields every file modified inside the
+    time window.
+
+    Args:
+        root: Local directory to scan
+        start_ns: Window start in nanoseconds since the epoch (inclusive)
+        end_ns: Window end in nanoseconds since the epoch (inclusive)
+        exclude: Optional name test from make_dir_exclude()
+        prune_before: If set, skip directories older than it, as iter_dirs() does
+            for [scan] prune_by_dir_mtime
+
+    Yields:
+        (parent_dir, file_path, stat_result): The file's directory, its full
+        path and the full stat result the window check used, so the tarball
+        headers never need the file stat'd again
+    """
+    for dir_path, dir_fd, files in iter_dirs(root, prune_before, exclude):
+        yield from _modified_in_dir(dir_path, dir_fd, files, start_ns, end_ns)
+
+def scan_modified(root, start_ns, end_ns, workers=SCAN_WORKERS, exclude=None, prune_before=None):
+    """
+    Same as iter_modified(), but walks each top-level subdirectory of root in its
+    own thread.
+
+    The walk is dominated by waiting on scandir() and stat(), which release the
+    GIL, so subtrees on separate project directories overlap their I/O.
+
+    Returns:
+        list: (parent_dir, file_path, stat_result) for every modified file
+    """
+    try:
+        dir_fd, files, subdirs = scan_dir(root, prune_before, exclude)
+    except OSError:
+        return []
+    matches = list(_modified_in_dir(root, dir_fd, files, start_ns, end_ns))
+
+    def walk_subtree(subdir):
+        # Each thread builds its own list; they are only merged below
+        return list(iter_modified(subdir, start_ns, end_ns, exclude, prune_before))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for subtree in pool.map(walk_subtree, subdirs):
+            matches.extend(subtree)
+    return matches
+
+def open_mtime_index(db_path):
+    """
+    Opens the persistent index used by scan_indexed(), creating it if missing.
+
+    Returns:
+        sqlite3.Connection: The open index
+    """
+    conn = sqlite3.connect(db_path)
+    # WAL with synchronous=NORMAL only syncs at checkpoints; a crash can at worst
+    # lose the last run's updates, and the next run rescans those directories
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(
+        "CREATE TABLE IF NOT EXISTS dirs ("
+        "path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);"
+        "CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);"
+        "CREATE TABLE IF NOT EXISTS files ("
+        "path TEXT PRIMARY KEY, dir TEXT, mtime_ns INTEGER, size INTEGER);"
+        "CREATE INDEX IF NOT EXISTS files_dir ON files (dir);"
+        "CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime_ns);"
+    )
+    return conn
+
+def _subtree_range(path):
+    # Every path below path sorts between path + sep and path + the next character
+    return path + os.sep, path + chr(ord(os.sep) + 1)
+
+def _forget_dir(conn, path):
+    """
+    Drops a directory and everything below it from the index.
+    """
+    lo, hi = _subtree_range(path)
+    conn.execute("DELETE FROM files WHERE path >= ? AND path < ?", (lo, hi))
+    conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, lo, hi))
+
+def scan_indexed(conn, root, start_ns, end_ns, exclude=None):
+    """
+    Same as scan_modified(), but only lists the directories that changed since
+    the previous run, using the index from open_mtime_index().
+
+    Creating, deleting or renaming a file updates its directory's mtime, so a
+    directory whose mtime still matches the index holds exactly the files the
+    index lists. Only its indexed subdirectories are checked, which costs one
+    stat() per directory instead of one per file. Changed directories are
+    rescanned and their rows replaced, all in a single transaction. The window
+    is then answered from the index; matches that were not stat'd during this
+    run are stat'd once, so the tarball headers get a full stat result.
+
+    A file rewritten in place (opened and written, not replaced by a rename)
+    does not update its directory's mtime, and is only picked up once something
+    else changes in that directory. Delete the index after changing
+    SOURCE_ROOT, exclude_dirs or skip_hidden_dirs so that every directory is
+    listed again.
+
+    Args:
+        conn: Index returned by open_mtime_index()
+        root: Local directory to scan
+        start_ns: Window start in nanoseconds since the epoch (inclusive)
+        end_ns: Window end in nanoseconds since the epoch (inclusive)
+        exclude: Optional name test from make_dir_exclude()
+
+    Returns:
+        list: (parent_dir, file_path, stat_result) for every modified file
+    """
+    # Stat results of matches in rescanned directories, so they are not stat'd twice
+    seen = {}
+    with conn:
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                dir_mtime_ns = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                _forget_dir(conn, path)
+                continue
+            except OSError:
+                continue
+
+            row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+            if row is not None and row[0] == dir_mtime_ns:
+                stack.extend(p for p, in conn.execute(
+                    "SELECT path FROM dirs WHERE parent = ?", (path,)))
+                continue
+
+            try:
+                dir_fd, entries, subdirs = scan_dir(path, exclude=exclude)
+            except OSError:
+                continue
+            files = []
+            try:
+                for entry in entries:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    file_path = os.path.join(path, entry.name)
+                    files.append((file_path, path, st.st_mtime_ns, st.st_size))
+                    if start_ns <= st.st_mtime_ns <= end_ns:
+                        seen[file_path] = st
+            finally:
+                if dir_fd is not None:
+                    os.close(dir_fd)
+
+            # Subdirectories that are gone take their whole subtree with them
+            old_subdirs = {p for p, in conn.execute(
+                "SELECT path FROM dirs WHERE parent = ?", (path,))}
+            for gone in old_subdirs.difference(subdirs):
+                _forget_dir(conn, gone)
+            conn.execute("DELETE FROM files WHERE dir = ?", (path,))
+            conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", files)
+            # New subdirectories get a row without an mtime, so one that cannot be
+            # read now is still retried on later runs
+            conn.executemany(
+                "INSERT OR IGNORE INTO dirs VALUES (?, ?, NULL)",
+                [(d, path) for d in subdirs]
+            )
+            # The mtime is the one read before listing, so anything created while
+            # listing makes the directory look changed next time
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                (path, os.path.dirname(path), dir_mtime_ns)
+            )
+            stack.extend(subdirs)
+
+    # Limited to root, so rows left from an earlier SOURCE_ROOT never match
+    lo, hi = _subtree_range(root)
+    matches = []
+    for dir_path, file_path in conn.execute(
+            "SELECT dir, path FROM files "
+            "WHERE mtime_ns BETWEEN ? AND ? AND path >= ? AND path < ?",
+            (start_ns, end_ns, lo, hi)):
+        st = seen.get(file_path)
+        if st is None:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            if not start_ns <= st.st_mtime_ns <= end_ns:
+                continue
+        matches.append((dir_path, file_path, st))
+    return matches
+
+@functools.lru_cache(maxsize=None)
+def find_gnu_tar():
+    """
+    Returns the path of the GNU tar binary, or None if tar is missing or is
+    another implementation (e.g. bsdtar on macOS). Checked once per process.
+    """
+    tar_bin = shutil.which('tar')
+    if tar_bin is None:
+        return None
+    try:
+        result = subprocess.run([tar_bin, '--version'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return tar_bin if 'GNU tar' in result.stdout else None
+
+def _write_tar_gnu(tar_bin, abs_tar_path, source_dir, arcnames, tar_format):
+    """
+    Archives the named files of source_dir with GNU tar, so the file data never
+    passes through Python. Names go in on stdin, NUL-separated; with --null tar
+    takes them literally, even ones starting with '-'. --dereference stores a
+    symlinked file's data, as the scan (and the tarfile fallback) did.
+    """
+    fmt = 'ustar' if tar_format == tarfile.USTAR_FORMAT else 'gnu'
+    subprocess.run(
+        [tar_bin, '--create', '--file', abs_tar_path, '--format', fmt, '--dereference',
+         '-C', source_dir, '--null', '--files-from=-'],
+        input=b'\0'.join(os.fsencode(name) for name in arcnames),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+
+def _write_tar_python(abs_tar_path, file_list, arcnames, tar_format):
+    """
+    Archives file_list with the tarfile module, for systems without GNU tar.
+    """
+    # mode='w|' is an uncompressed stream. Use 'w|gz' for compression
+    # The archive is written once front to back and never read back or seeked, so
+    # stream mode is safe; tarfile then collects output in TAR_STREAM_BUFSIZE
+    # blocks, and the file buffer turns those into a few big write() calls
+    with open(abs_tar_path, "wb", buffering=TAR_WRITE_BUFFER) as fh:
+        with tarfile.open(fileobj=fh, mode="w|", format=tar_format,
+                          bufsize=TAR_STREAM_BUFSIZE) as tar:
+            # One regular-file header reused for every member: addfile() stores its
+            # own copy, so only the per-file fields are set below
+            info = tarfile.TarInfo()
+            for (file_path, st), arcname in zip(file_list, arcnames):
+                # Header built from the scan's stat; tar.add() would lstat the file again
+                info.name = arcname
+                info.size = st.st_size
+                # Whole seconds: a fractional mtime would need a PAX header
+                info.mtime = int(st.st_mtime)
+                info.mode = st.st_mode & 0o7777
+                info.uid = st.st_uid
+                info.gid = st.st_gid
+                with open(file_path, 'rb') as src:
+                    tar.addfile(info, src)
+
+def fits_ustar(arcname, st):
+    """
+    Returns True if a member can be stored in a plain USTAR header: a name of at
+    most 100 bytes (arcnames are basenames, so there is no prefix field to split
+    into), a size below 8 GiB, an mtime between 1970 and the 11 octal digits'
+    limit, and uid/gid that fit in 7 octal digits.
+
+    Both writers dereference symlinks, so every member is a regular file
+    described by st (the target's stat) and there is no link name to check.
+    """
+    return (len(os.fsencode(arcname)) <= USTAR_NAME_MAX
+            and st.st_size <= USTAR_SIZE_MAX
+            and 0 <= st.st_mtime <= USTAR_TIME_MAX
+            and st.st_uid <= USTAR_ID_MAX
+            and st.st_gid <= USTAR_ID_MAX)
 
 def create_tarball(staging_root, rel_path, file_list):
     """
     Creates a tarball locally in the STAGING_ROOT.
+
+    Uses GNU tar when it is installed and the tarfile module otherwise. Both
+    store each file under its basename.
     
     Args:
         staging_root: Local path to write tars (e.g. /scratch/negishi/rwilfong/globus_stage)
         rel_path: The relative path of the source dir (e.g. 'project/data/01')
-        file_list: List of absolute file paths to include in the tar
+        file_list: List of (absolute file path, stat_result) to include in the
+            tar, all in the same directory
         
     Returns:
         abs_tar_path: The full path to the generated tarball.
@@ -62,41 +396,79 @@ def create_tarball(staging_root, rel_path, file_list):
     safe_name = rel_path.replace(os.sep, '_') + ".tar"
     abs_tar_path = os.path.join(staging_root, safe_name)
 
+    arcnames = [os.path.basename(file_path) for file_path, _ in file_list]
+    # Uncompressed USTAR: the data is usually already compressed, and USTAR skips
+    # the PAX extended headers Python writes by default. GNU handles what USTAR
+    # cannot hold with compact extensions instead of PAX records.
+    if all(fits_ustar(name, st) for name, (_, st) in zip(arcnames, file_list)):
+        tar_format = tarfile.USTAR_FORMAT
+    else:
+        tar_format = tarfile.GNU_FORMAT
+
     # Create the tarball
-    # mode='w' is uncompressed. Use 'w:gz' for compression
+    tar_bin = find_gnu_tar()
     try:
-        with tarfile.open(abs_tar_path, "w") as tar:
-            for file_path in file_list:
-                tar.add(file_path, arcname=os.path.basename(file_path))
+        if tar_bin:
+            source_dir = os.path.dirname(file_list[0][0])
+            _write_tar_gnu(tar_bin, abs_tar_path, source_dir, arcnames, tar_format)
+        else:
+            _write_tar_python(abs_tar_path, file_list, arcnames, tar_format)
         return abs_tar_path
+    except subprocess.CalledProcessError as e:
+        print(f"Error creating tar: {e.stderr.decode(errors='replace').strip()}")
+        return None
     except IOError as e:
         print(f"Error creating tar: {e}")
         return None
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Nightly Globus archive with small-file tarballs")
+    parser.add_argument(
+        "--refresh-secret",
+        action="store_true",
+        help="Re-read the client secret from keyring and discard the cached access token"
+    )
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     logger = setup_logging()
     config = configparser.ConfigParser()
     config.read('config_nightly.ini')
 
     try:
         # Extract from config
+        # Each section is copied to a plain dict once, so the lookups below skip
+        # configparser's per-access interpolation and key folding.
+        # configparser lower-cases option names, so the dict keys are lower case.
+        paths = dict(config['paths'])
+        globus = dict(config['globus'])
+
         # Paths
-        SOURCE_ROOT = os.path.abspath(config['paths']['SOURCE_ROOT'])
-        GLOBUS_SOURCE_ROOT = config['paths']['GLOBUS_SOURCE_ROOT']
+        SOURCE_ROOT = os.path.abspath(paths['source_root'])
+        GLOBUS_SOURCE_ROOT = paths['globus_source_root']
         
         # Local staging 
-        STAGING_ROOT = os.path.abspath(config['paths']['STAGING_ROOT']) 
+        STAGING_ROOT = os.path.abspath(paths['staging_root']) 
         # The Globus path to that scratch space (usually same as STAGING_ROOT)
-        GLOBUS_STAGING_ROOT = config['paths'].get('GLOBUS_STAGING_ROOT', STAGING_ROOT)
+        GLOBUS_STAGING_ROOT = paths.get('globus_staging_root', STAGING_ROOT)
 
         # Globus IDs
         SERVICE_NAME = config['keyring']['service_name']
-        CLIENT_ID = config['globus']['client_id']
-        SOURCE_EP = config['globus']['SOURCE_ENDPOINT_ID']
-        DEST_EP = config['globus']['DEST_ENDPOINT_ID']
-        DEST_ROOT = config['globus']['DEST_BASE_PATH']
+        CLIENT_ID = globus['client_id']
+        SOURCE_EP = globus['source_endpoint_id']
+        DEST_EP = globus['dest_endpoint_id']
+        DEST_ROOT = globus['dest_base_path']
+
+        # Scan options
+        # Unset options exclude nothing; the example INI lists suggested values
+        EXCLUDE_DIRS = config.get('scan', 'exclude_dirs', fallback='')
+        EXCLUDE_DIRS = [d.strip() for d in EXCLUDE_DIRS.split(',') if d.strip()]
+        SKIP_HIDDEN_DIRS = config.getboolean('scan', 'skip_hidden_dirs', fallback=False)
+        PRUNE_BY_DIR_MTIME = config.getboolean('scan', 'prune_by_dir_mtime', fallback=False)
+        MTIME_INDEX = config.getboolean('scan', 'mtime_index', fallback=False)
     except KeyError as e:
-        logger.error(f"Missing config: {e}")
+        logger.error("Missing config: %s", e)
         return
 
     # Define time window -- yesterday 
@@ -104,21 +476,33 @@ def main():
     start_window = datetime.combine(yesterday, time.min)
     end_window = datetime.combine(yesterday, time.max)
     
-    logger.info(f"Scanning {SOURCE_ROOT} for changes on {yesterday}...")
+    logger.info("Scanning %s for changes on %s...", SOURCE_ROOT, yesterday)
 
     # Scan and group the files
-    # Dictionary structure: { 'absolute/path/to/folder': [file1, file2] }
-    modified_groups = defaultdict(list)
+    # Dictionary structure: { 'absolute/path/to/folder': [[(file1, st1), (file2, st2)], total_size] }
+    # The size comes from the scan's stat, so files are never stat'd a second time
+    modified_groups = defaultdict(lambda: [[], 0])
     
-    for root, dirs, files in os.walk(SOURCE_ROOT):
-        for f in files:
-            file_path = os.path.join(root, f)
-            try:
-                mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if start_window <= mtime <= end_window:
-                    modified_groups[root].append(file_path)
-            except OSError:
-                continue
+    # Integer nanosecond bounds, computed as in the recurring scripts
+    start_ns = datetime_to_ns(start_window)
+    end_ns = window_end_ns(end_window)
+    exclude = make_dir_exclude(EXCLUDE_DIRS, SKIP_HIDDEN_DIRS)
+    if MTIME_INDEX:
+        # The index tracks directory mtimes itself, so prune_by_dir_mtime is ignored
+        index = open_mtime_index(MTIME_INDEX_PATH)
+        try:
+            matches = scan_indexed(index, SOURCE_ROOT, start_ns, end_ns, exclude)
+        finally:
+            index.close()
+    else:
+        prune_before = start_ns if PRUNE_BY_DIR_MTIME else None
+        matches = scan_modified(SOURCE_ROOT, start_ns, end_ns, exclude=exclude, prune_before=prune_before)
+    for root, file_path, st in matches:
+        group = modified_groups[root]
+        group[0].append((file_path, st))
+        group[1] += st.st_size
+    if exclude is not None and exclude.skipped:
+        logger.info("Skipped %d directories excluded by [scan] options.", len(exclude.skipped))
 
     if not modified_groups:
         logger.info("No modified files found.")
@@ -126,7 +510,7 @@ def main():
 
     # Prep transfer
     try:
-        tc = globus_sdk.TransferClient(authorizer=get_authorizer(SERVICE_NAME, CLIENT_ID))
+        tc = get_transfer_client(SERVICE_NAME, CLIENT_ID, args.refresh_secret)
         transfer_data = globus_sdk.TransferData(
             source_endpoint=SOURCE_EP,
             destination_endpoint=DEST_EP,
@@ -134,56 +518,87 @@ def main():
             sync_level="mtime"
         )
     except Exception as e:
-        logger.error(f"Globus Init Failed: {e}")
+        logger.error("Globus Init Failed: %s", e)
         return
 
     files_queued = 0
     tars_created = 0
 
+    # Globus paths below are built by concatenating onto these prefixes
+    src_prefix = root_prefix(GLOBUS_SOURCE_ROOT)
+    dst_prefix = root_prefix(DEST_ROOT)
+    staging_prefix = root_prefix(GLOBUS_STAGING_ROOT)
+
+    # Folders to tar, as (tar_name_base, file_list)
+    tar_jobs = []
+
     # Iterate groups and decide (tar vs raw)
-    for folder_abs_path, file_list in modified_groups.items():
+    for folder_abs_path, (file_list, total_size) in modified_groups.items():
         rel_path = os.path.relpath(folder_abs_path, SOURCE_ROOT)
         
         tar_name_base = "root_files" if rel_path == '.' else rel_path
         
-        # Calculate stats
-        total_size = sum(os.path.getsize(f) for f in file_list)
-        avg_size = total_size / len(file_list) if file_list else 0
-        
-        # Tar if files are small
-        if avg_size < SMALL_FILE_THRESHOLD:
-            logger.info(f"Tarring {rel_path} ({len(file_list)} files, Avg: {avg_size/1024:.1f}KB)")
+        # Tar if files are small: average size below the threshold, compared as
+        # integers so the average is only worked out for the log line
+        n = len(file_list)
+        if n and total_size < SMALL_FILE_THRESHOLD * n:
+            logger.info("Tarring %s (%d files, Avg: %.1fKB)", rel_path, n, total_size / n / 1024)
             
             # Pass our fixed tar_name_base
-            tar_local_path = create_tarball(STAGING_ROOT, tar_name_base, file_list)
-            
-            if tar_local_path:
-                rel_tar_name = os.path.basename(tar_local_path)
-                g_source = posixpath.join(GLOBUS_STAGING_ROOT, rel_tar_name)
-                
-                # Dest path: target/path/to/folder.tar (use fixed base)
-                g_dest = posixpath.join(DEST_ROOT, tar_name_base + ".tar")
-                
-                transfer_data.add_item(g_source, g_dest)
-                tars_created += 1
-                files_queued += 1
+            tar_jobs.append((tar_name_base, file_list))
         else:
             # Transfer raw files
-            logger.info(f"Transferring raw {rel_path} (Avg: {avg_size/1024/1024:.1f}MB)")
-            for f in file_list:
-                rel_file = os.path.relpath(f, SOURCE_ROOT)
-                g_source = posixpath.join(GLOBUS_SOURCE_ROOT, rel_file)
-                g_dest = posixpath.join(DEST_ROOT, rel_file)
-                transfer_data.add_item(g_source, g_dest)
-                files_queued += 1
+            logger.info("Transferring raw %s (Avg: %.1fMB)", rel_path, total_size / n / 1024 / 1024)
+            # Every file in the group shares rel_path, so only the name is added per file
+            rel_prefix = '' if rel_path == '.' else rel_path + '/'
+            g_source_dir = src_prefix + rel_prefix
+            g_dest_dir = dst_prefix + rel_prefix
+            names = [os.path.basename(f) for f, _ in file_list]
+            # One line per file, so skip the loop entirely unless DEBUG is on
+            if logger.isEnabledFor(logging.DEBUG):
+                for name in names:
+                    logger.debug("  %s -> %s", g_source_dir + name, g_dest_dir + name)
+            # Same transfer_item documents add_item() builds, appended in one call
+            # instead of one method call (and debug log format) per file
+            transfer_data["DATA"].extend(
+                {
+                    "DATA_TYPE": "transfer_item",
+                    "source_path": g_source_dir + name,
+                    "destination_path": g_dest_dir + name,
+                }
+                for name in names
+            )
+            files_queued += len(names)
+
+    # Each folder's tarball is independent, so build them in parallel processes
+    if tar_jobs:
+        with ProcessPoolExecutor(max_workers=min(TAR_WORKERS, len(tar_jobs))) as pool:
+            tar_paths = pool.map(
+                create_tarball,
+                [STAGING_ROOT] * len(tar_jobs),
+                [tar_name_base for tar_name_base, _ in tar_jobs],
+                [file_list for _, file_list in tar_jobs]
+            )
+            for (tar_name_base, _), tar_local_path in zip(tar_jobs, tar_paths):
+                if tar_local_path:
+                    rel_tar_name = os.path.basename(tar_local_path)
+                    g_source = staging_prefix + rel_tar_name
+
+                    # Dest path: target/path/to/folder.tar (use fixed base)
+                    g_dest = dst_prefix + tar_name_base + ".tar"
+
+                    transfer_data.add_item(g_source, g_dest)
+                    tars_created += 1
+                    files_queued += 1
 
     # Submit
     if files_queued > 0:
         task = tc.submit_transfer(transfer_data)
-        logger.info(f"Task Submitted: {task['task_id']}")
+        logger.info("Task Submitted: %s", task['task_id'])
         if tars_created > 0:
-            logger.warning(f"Created {tars_created} tarballs in {STAGING_ROOT}. "
-                           "Ensure you have a cleanup cron job (find ... -delete) running separately.")
+            logger.warning("Created %d tarballs in %s. "
+                           "Ensure you have a cleanup cron job (find ... -delete) running separately.",
+                           tars_created, STAGING_ROOT)
     else:
         logger.info("Nothing to transfer.")
 